@@ -1,10 +1,23 @@
 import os
+import tempfile
+import warnings
+from datetime import datetime
+from zipfile import ZipFile, ZIP_DEFLATED
 import pandas as pd
-from openpyxl import Workbook, load_workbook
+from openpyxl import LXML, Workbook, load_workbook
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.manifest import Manifest
+from openpyxl.packaging.relationship import get_rels_path
+from openpyxl.reader.excel import _find_workbook_part
+from openpyxl.reader.workbook import WorkbookParser
+from openpyxl.styles.stylesheet import write_stylesheet
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.xml.constants import ARC_CONTENT_TYPES, SHEET_MAIN_NS
+from openpyxl.xml.functions import fromstring, tostring
 import numpy as np
 
 class DataFrameXL(pd.DataFrame):
-    _metadata = ["_filename", "_sheet_name", "_wb", "_ws", "_styles"]
+    _metadata = ["_filename", "_sheet_name", "_wb", "_ws", "_styles", "_detached"]
 
     @property
     def _constructor(self):
@@ -12,10 +25,12 @@ class DataFrameXL(pd.DataFrame):
         return DataFrameXL
 
 
-    def __init__(self, data=None, filename=None, sheet_name="Hoja1", df: pd.DataFrame = None, *args, **kwargs):
+    def __init__(self, data=None, filename=None, sheet_name="Hoja1", df: pd.DataFrame = None, *args, detached=False, compact=False, **kwargs):
         self._filename = filename
         self._sheet_name = sheet_name
         self._styles = {}
+        # Modo desacoplado: la hoja no conserva sus celdas y se reconstruye desde el DataFrame al guardar
+        self._detached = detached
 
         if df is None:
             # Caso 1: inicialización desde Excel
@@ -26,13 +41,31 @@ class DataFrameXL(pd.DataFrame):
                 else:
                     self._ws = self._wb.create_sheet(sheet_name)
 
-                values = list(self._ws.values)
-                if values:
-                    columns = values[0]
-                    rows = values[1:]
-                    df = pd.DataFrame(rows, columns=columns)
+                columns, n_rows = (), 0
+                if compact:
+                    # Construir cada columna directamente desde las filas, sin lista intermedia de tuplas
+                    rows = self._ws.iter_rows(values_only=True)
+                    columns = next(rows, None) or ()
+                    col_values = [[] for _ in columns]
+                    for row in rows:
+                        for col, val in zip(col_values, row):
+                            col.append(val)
+                    if columns:
+                        n_rows = len(col_values[0])
+                        df = pd.DataFrame({j: self._compact_column(col) for j, col in enumerate(col_values)})
+                        df.columns = list(columns)
+                    else:
+                        df = pd.DataFrame()
+                    del col_values
                 else:
-                    df = pd.DataFrame()
+                    values = list(self._ws.values)
+                    if values:
+                        columns = values[0]
+                        rows = values[1:]
+                        n_rows = len(rows)
+                        df = pd.DataFrame(rows, columns=columns)
+                    else:
+                        df = pd.DataFrame()
 
                 # Extraer estilos de cada celda y guardarlos en _styles
                 for j, col_name in enumerate(columns):
@@ -50,7 +83,7 @@ class DataFrameXL(pd.DataFrame):
                     }
 
                     # 2) Estilos de las filas de datos
-                    for i, row in enumerate(rows):
+                    for i in range(n_rows):
                         cell = self._ws.cell(row=i+2, column=j+1)  # +2 porque fila 1 es encabezado
                         self._styles[col_name][i] = {
                             "font": cell.font,
@@ -61,6 +94,10 @@ class DataFrameXL(pd.DataFrame):
                             "protection": cell.protection,
                         }
 
+                # Datos y estilos ya extraídos: liberar la rejilla de celdas de openpyxl
+                if detached:
+                    self._release_cells()
+
                 super().__init__(df, *args, **kwargs)
             else:
                 # Caso 2: inicialización desde datos
@@ -83,9 +120,18 @@ class DataFrameXL(pd.DataFrame):
                 self._ws = None
             super().__init__(df, *args, **kwargs)
 
-    def save(self, filename=None):
-        if filename == None:
+    def save(self, filename=None, incremental=False):
+        """
+        Guarda la hoja en Excel. Con incremental=True solo se regeneran la hoja
+        propia y los estilos; el resto de partes se copian del archivo original.
+        """
+        if not filename:
             filename = self._filename
+        detached = getattr(self, "_detached", False)
+        # 0. En modo desacoplado la hoja se reconstruye desde cero a partir del DataFrame
+        if detached:
+            self._release_cells()
+
         # 1. Aplicar estilos antes de guardar
         self.__apply_all_styles()
 
@@ -97,13 +143,257 @@ class DataFrameXL(pd.DataFrame):
         for i in range(len(self)):
             for j, col_name in enumerate(self.columns):
                 val = self.iat[i, j]
-                self._ws.cell(row=i+2, column=j+1, value=val)
+                self._ws.cell(row=i+2, column=j+1, value=self._excel_value(val))
 
         # 4. Guardar archivo
-        if filename:
+        if incremental:
+            fallback = self._save_incremental(filename)
+            if fallback is not None:
+                warnings.warn(
+                    f"Guardado incremental no disponible ({fallback}); se guarda el libro completo.",
+                    stacklevel=2,
+                )
+        if not incremental or fallback is not None:
             self._wb.save(filename)
-        else:
-            self._wb.save(self._filename)
+
+        # 5. Volver a soltar las celdas reconstruidas
+        if detached:
+            self._release_cells()
+
+    def _save_incremental(self, filename):
+        """
+        Reescribe solo la hoja propia, styles.xml y calcChain.xml sobre una copia
+        del archivo original. Devuelve None si se guardó, o el motivo por el que
+        hay que hacer un guardado completo.
+
+        Solo se detectan cambios de estructura del libro (hojas añadidas, borradas,
+        renombradas, reordenadas u ocultadas); las celdas editadas directamente en
+        otras hojas a través de self._wb no se detectan y se pierden.
+        """
+        source = self._filename
+        ws = self._ws
+        if not isinstance(filename, (str, os.PathLike)):
+            return "el destino no es una ruta"
+        if not (isinstance(source, str) and os.path.exists(source)):
+            return "no hay archivo original"
+        # Dibujos, tablas y tablas dinámicas generan partes nuevas en el paquete
+        if ws._images or ws._charts or ws._tables or ws._pivots or ws.legacy_drawing is not None:
+            return "la hoja tiene imágenes, gráficos, tablas o comentarios"
+
+        with ZipFile(source) as archive:
+            manifest = Manifest.from_tree(fromstring(archive.read(ARC_CONTENT_TYPES)))
+            wb_part = _find_workbook_part(manifest).PartName[1:]
+            parser = WorkbookParser(archive, wb_part)
+            parser.parse()
+
+            sheet_path = sheet_id = None
+            original_sheets = []
+            for sheet, rel in parser.find_sheets():
+                original_sheets.append((sheet.name, sheet.state or "visible"))
+                if sheet.name == ws.title:
+                    sheet_path, sheet_id = rel.target, sheet.sheetId
+            # workbook.xml se copia tal cual: la estructura de hojas no puede haber cambiado
+            if [(sheet.title, sheet.sheet_state) for sheet in self._wb._sheets] != original_sheets:
+                return "las hojas del libro han cambiado"
+            parts = {rel.Type.rsplit("/", 1)[-1]: (rel_id, rel.target) for rel_id, rel in parser.rels.items()}
+            styles_path = parts.get("styles", (None, None))[1]
+            calc_id, calc_path = parts.get("calcChain", (None, None))
+            if sheet_path is None:
+                return "la hoja no existe en el archivo original"
+            if styles_path is None:
+                return "el archivo original no tiene styles.xml"
+
+            # 1. Serializar la hoja modificada
+            ws._drawing = SpreadsheetDrawing()
+            writer = WorksheetWriter(ws)
+            try:
+                writer.write()
+                rels_path = get_rels_path(sheet_path)
+                if ws._comments:
+                    return "la hoja tiene comentarios"
+                if writer._rels and rels_path in archive.namelist():
+                    return "la hoja ya tiene relaciones y se han añadido hipervínculos externos"
+                # sharedStrings.xml se copia tal cual: solo es válido si la hoja
+                # reescrita no usa índices de cadenas compartidas (openpyxl escribe inlineStr)
+                with open(writer.out, "rb") as fh:
+                    if b't="s"' in fh.read():
+                        return "la hoja reescrita usa cadenas compartidas"
+
+                # 2. Regenerar estilos: los índices originales de cellXfs se conservan
+                #    y los estilos nuevos se añaden al final
+                stylesheet = tostring(write_stylesheet(self._wb))
+
+                # 3. Quitar de la cadena de cálculo las fórmulas de la hoja reescrita;
+                #    si no queda ninguna se elimina la parte (Excel la reconstruye)
+                calc_chain = content_types = wb_rels = None
+                wb_rels_path = get_rels_path(wb_part)
+                if calc_path is not None:
+                    calc_chain = self._filter_calc_chain(archive.read(calc_path), sheet_id)
+                    if calc_chain is None:
+                        content_types = self._drop_xml_entry(
+                            archive.read(ARC_CONTENT_TYPES), "PartName", "/" + calc_path)
+                        wb_rels = self._drop_xml_entry(archive.read(wb_rels_path), "Id", calc_id)
+
+                # 4. Copiar el resto de partes tal cual desde el archivo original
+                folder = os.path.dirname(os.path.abspath(filename))
+                fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=folder)
+                os.close(fd)
+                try:
+                    with ZipFile(tmp_path, "w", ZIP_DEFLATED, allowZip64=True) as out:
+                        for info in archive.infolist():
+                            name = info.filename
+                            if name == sheet_path:
+                                out.write(writer.out, name)
+                            elif name == styles_path:
+                                out.writestr(name, stylesheet)
+                            elif name == calc_path:
+                                if calc_chain is not None:
+                                    out.writestr(name, calc_chain)
+                            elif name == ARC_CONTENT_TYPES and content_types is not None:
+                                out.writestr(name, content_types)
+                            elif name == wb_rels_path and wb_rels is not None:
+                                out.writestr(name, wb_rels)
+                            else:
+                                out.writestr(info, archive.read(info))
+                        if writer._rels:
+                            out.writestr(rels_path, tostring(writer._rels.to_tree()))
+                except Exception:
+                    os.remove(tmp_path)
+                    raise
+            finally:
+                writer.cleanup()
+
+        os.replace(tmp_path, filename)
+        return None
+
+    @staticmethod
+    def _excel_value(val):
+        """
+        Convierte los valores ausentes de pandas (NA, NaT) en celdas vacías y los
+        escalares de numpy en tipos de Python (openpyxl escribe np.bool_ como 1/0).
+        """
+        if val is pd.NA or val is pd.NaT:
+            return None
+        if isinstance(val, (np.bool_, np.integer, np.floating)):
+            return val.item()
+        return val
+
+    # Proporción máxima de valores distintos para convertir una columna de texto en categórica
+    _CATEGORY_RATIO = 0.5
+
+    @classmethod
+    def _compact_column(cls, values):
+        """
+        Infiere en una sola pasada el tipo más compacto para una columna leída de Excel:
+        enteros reducidos a int32 como mínimo (nullable si hay celdas vacías), fechas,
+        booleanos y texto categórico cuando hay pocos valores distintos. Si no, se deja
+        que pandas decida.
+        """
+        if not values:
+            return np.array(values, dtype=object)
+        kinds = set()
+        nulls = 0
+        for val in values:
+            if val is None:
+                nulls += 1
+            elif isinstance(val, bool):
+                kinds.add(bool)
+            elif isinstance(val, (int, np.integer)):
+                kinds.add(int)
+            elif isinstance(val, (float, np.floating)):
+                kinds.add(float)
+            elif isinstance(val, datetime):
+                kinds.add(datetime)
+            elif isinstance(val, str):
+                kinds.add(str)
+            else:
+                kinds.add(object)
+
+        if kinds == {int}:
+            non_null = [val for val in values if val is not None]
+            lo, hi = min(non_null), max(non_null)
+            # int8/int16 desbordarían sin aviso en operaciones posteriores (df["qty"] * 2)
+            for dtype in (np.int32, np.int64):
+                info = np.iinfo(dtype)
+                if info.min <= lo and hi <= info.max:
+                    break
+            else:
+                return values
+            if nulls:
+                return pd.array(values, dtype=np.dtype(dtype).name.capitalize())
+            return np.array(values, dtype=dtype)
+        if kinds in ({float}, {int, float}):
+            return np.array([np.nan if val is None else val for val in values], dtype=np.float64)
+        if kinds == {bool}:
+            return pd.array(values, dtype="boolean") if nulls else np.array(values, dtype=bool)
+        if kinds == {datetime}:
+            # Fechas centinela (p. ej. 9999-12-31) quedan fuera del rango de datetime64[ns]
+            try:
+                return pd.to_datetime(values)
+            except pd.errors.OutOfBoundsDatetime:
+                return values
+        if kinds == {str}:
+            n_values = len(values) - nulls
+            if len(set(values)) - (1 if nulls else 0) <= n_values * cls._CATEGORY_RATIO:
+                return pd.Categorical(values)
+        return values
+
+    @staticmethod
+    def _filter_calc_chain(xml, sheet_id):
+        """
+        Elimina de calcChain.xml las celdas de la hoja sheet_id. Devuelve None
+        si la cadena queda vacía (Excel no admite un calcChain sin celdas y hay
+        que eliminar la parte).
+        """
+        root = fromstring(xml)
+        current = None
+        for c in list(root.iter("{%s}c" % SHEET_MAIN_NS)):
+            # "i" se omite cuando coincide con el de la celda anterior
+            current = c.get("i", current)
+            if current is not None and int(current) == sheet_id:
+                root.remove(c)
+            elif current is not None:
+                c.set("i", current)
+        if not len(root):
+            return None
+        return DataFrameXL._serialize_part(root)
+
+    @staticmethod
+    def _drop_xml_entry(xml, attr, value):
+        """
+        Quita de una parte ([Content_Types].xml, *.rels) los elementos hijos
+        cuyo atributo attr vale value.
+        """
+        root = fromstring(xml)
+        for child in list(root):
+            if child.get(attr) == value:
+                root.remove(child)
+        return DataFrameXL._serialize_part(root)
+
+    @staticmethod
+    def _serialize_part(root):
+        """Serializa una parte conservando su espacio de nombres por defecto (sin prefijos ns0:)."""
+        if LXML:
+            # lxml conserva los prefijos del documento original
+            return tostring(root)
+        # Igual que openpyxl en to_tree: etiquetas sin prefijo y xmlns explícito en la raíz
+        ns = root.tag[1:].split("}")[0]
+        qualified = "{%s}" % ns
+        for el in root.iter():
+            if el.tag.startswith(qualified):
+                el.tag = el.tag[len(qualified):]
+        root.set("xmlns", ns)
+        return tostring(root)
+
+    def _release_cells(self):
+        """
+        Libera las celdas de la hoja propia del DataFrame (self._ws) conservando el resto del workbook
+        (otras hojas, anchos de columna, rangos combinados y nombres definidos).
+        Los hipervínculos y comentarios de las celdas se pierden.
+        """
+        if self._ws is None:
+            return
+        self._ws._cells.clear()
 
     def __apply_all_styles(self):
         if not hasattr(self, "_styles"):
@@ -166,6 +456,7 @@ class DataFrameXL(pd.DataFrame):
     def loc(self):
         base_loc = super().loc
         ws = self._ws
+        detached = getattr(self, "_detached", False)
         columns = list(self.columns)
 
         class _CustomLoc:
@@ -235,10 +526,12 @@ class DataFrameXL(pd.DataFrame):
                     base_loc[key] = value
 
                 # --- Sincronizar Excel ---
+                if detached:
+                    return
                 try:
                     for j, col_name in enumerate(columns):
                         for i, val in enumerate(base_loc.obj[col_name]):
-                            ws.cell(row=i+2, column=j+1, value=val)
+                            ws.cell(row=i+2, column=j+1, value=self._excel_value(val))
 
 
                 except Exception as e:
@@ -253,6 +546,7 @@ class DataFrameXL(pd.DataFrame):
     def iloc(self):
         base_iloc = super().iloc
         ws = self._ws
+        detached = getattr(self, "_detached", False)
         columns = list(self.columns)
 
         class _CustomILoc:
@@ -300,10 +594,12 @@ class DataFrameXL(pd.DataFrame):
                     base_iloc[key] = value
 
                 # --- Sincronizar Excel ---
+                if detached:
+                    return
                 try:
                     for j, col_name in enumerate(columns):
                         for i, val in enumerate(base_iloc.obj[col_name]):
-                            ws.cell(row=i+2, column=j+1, value=val)
+                            ws.cell(row=i+2, column=j+1, value=self._excel_value(val))
 
                 except Exception as e:
                     print(f"[ERROR] No se pudo actualizar Excel desde iloc: {e}")
@@ -326,6 +622,9 @@ class DataFrameXL(pd.DataFrame):
 
         result = super().__setitem__(key, value)
 
+        if getattr(self, "_detached", False):
+            return result
+
         try:
             # Encontrar índice de columna en Excel
             if isinstance(key, str):
@@ -336,7 +635,7 @@ class DataFrameXL(pd.DataFrame):
             # Volcar toda la columna actualizada
             for i, val in enumerate(self[key]):
                 row_excel = i + 2  # +2 por cabecera
-                self._ws.cell(row=row_excel, column=col_excel, value=val)
+                self._ws.cell(row=row_excel, column=col_excel, value=self._excel_value(val))
 
         except Exception as e:
             print(f"[ERROR] No se pudo actualizar Excel: {e}")
@@ -358,12 +657,15 @@ class DataFrameXL(pd.DataFrame):
 
         result = super()._set_value(index, col, value, takeable=takeable)
 
+        if getattr(self, "_detached", False):
+            return result
+
         try:
             # Volcar toda la fila actualizada
             row_excel = index + 2
             for j, col_name in enumerate(self.columns):
                 val = self.at[index, col_name]
-                self._ws.cell(row=row_excel, column=j+1, value=val)
+                self._ws.cell(row=row_excel, column=j+1, value=self._excel_value(val))
 
         except Exception as e:
             print(f"[ERROR] No se pudo actualizar Excel desde _set_value: {e}")
@@ -460,7 +762,11 @@ class DataFrameXL(pd.DataFrame):
         result_df = pd.concat([self, other], axis=0, ignore_index=ignore_index)
 
         # 2. Actualizar self internamente
-        self.__init__(df=result_df, filename=self._filename, sheet_name=self._sheet_name)
+        detached = getattr(self, "_detached", False)
+        self.__init__(df=result_df, filename=self._filename, sheet_name=self._sheet_name, detached=detached)
+        self._styles = styles
+        if detached:
+            return self
 
         # 3. Volcar datos al Worksheet
         ws = self._ws
@@ -474,8 +780,7 @@ class DataFrameXL(pd.DataFrame):
         for i in range(len(result_df)):
             for j, col_name in enumerate(columns):
                 val = result_df.iat[i, j]
-                ws.cell(row=i+2, column=j+1, value=val)
-        self._styles = styles
+                ws.cell(row=i+2, column=j+1, value=self._excel_value(val))
         return self
 
 
@@ -543,7 +848,10 @@ class DataFrameXL(pd.DataFrame):
         col_positions = []
         row_positions = []
 
-        if self._ws is not None:
+        # En modo desacoplado no hay celdas que borrar: la hoja se reconstruye al guardar
+        synced = self._ws is not None and not getattr(self, "_detached", False)
+
+        if synced:
             # Encabezados en fila 1 para columnas
             if cols_to_remove:
                 header_values = [cell.value for cell in self._ws[1]]
@@ -569,7 +877,7 @@ class DataFrameXL(pd.DataFrame):
                 row_positions = [p + 2 for p in pos]
 
         # 2) LIMPIAR EL WORKSHEET PRIMERO (EVITAR BÚSQUEDAS TRAS DROP)
-        if self._ws is not None:
+        if synced:
             # Borrar columnas en orden descendente para no desalinear índices
             for j in sorted(set(col_positions), reverse=True):
                 self._ws.delete_cols(j)